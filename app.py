@@ -11,7 +11,7 @@ from src.ui.components import (
 )
 from src.ui.fundamental_chart import quarterly_fundamental_chart
 from src.ui.fundamental_table import render_core_fundamental_table
-from src.data_extraction import get_bigquery_client, get_all_and_quarterly, PROJECT_ID
+from src.data_extraction import cached_all_and_quarterly
 
 # ----------------- Page config -----------------
 st.set_page_config(
@@ -45,9 +45,8 @@ if active_code is not None:
     # ----------------- Load data -----------------
     table, summary, meta = load_payload(DATA_DIR, active_code)
 
-    # BigQuery data for the chart
-    client = get_bigquery_client(PROJECT_ID)
-    df_all, df_quarter = get_all_and_quarterly(active_code, client)
+    # BigQuery data for the chart (cached across reruns)
+    df_all, df_quarter = cached_all_and_quarterly(active_code)
 
     # ----------------- Create pages (tabs) -----------------
     tabs = st.tabs(["Fundamental Summary", "Sankey Diagram", "Money Flow"])
@@ -0,0 +1,23 @@
+-- Materialized views for the hot query paths. Run once per project;
+-- BigQuery refreshes them automatically when the base tables change.
+--
+-- To use them, point the env vars at the views instead of the base
+-- tables (e.g. BIGQUERY_TABLE_QUARTER=...mv_quarterly_by_code) —
+-- repeat per-code lookups then scan the pre-computed result instead of
+-- re-planning the full query.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS
+  `silver-ripple-355716.stocks_idx.mv_quarterly_by_code`
+AS
+SELECT
+  code, year, quarter, parameter, value_final
+FROM
+  `silver-ripple-355716.stocks_idx.fact_fundamental_quarterly`;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS
+  `silver-ripple-355716.stocks_idx.mv_ticker_subsector`
+AS
+SELECT
+  ticker, sub_sector
+FROM
+  `silver-ripple-355716.stocks_idx.stock_classification`;
@@ -1,8 +1,14 @@
+import asyncio
+import concurrent.futures
 import os
+import threading
 from typing import Optional
 
 import pandas as pd
+import requests.adapters
+import streamlit as st
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
 from google.cloud.exceptions import GoogleCloudError
 from dotenv import load_dotenv
 
@@ -28,15 +34,44 @@ BIGQUERY_TABLE_CLASSIFICATION = os.getenv(
     "silver-ripple-355716.stocks_idx.stock_classification"
 )
 
+# The quarterly consumers only ever read these columns, so the query is
+# narrowed accordingly instead of SELECT * over the full table. No year
+# filter is pushed down here: the shared fetch serves both the full-
+# history chart in app.py and the windowed main-page chart, which trims
+# years client-side.
+QUARTERLY_COLUMNS = ["code", "year", "quarter", "parameter", "value_final"]
 
-def get_bigquery_client(project_id: str) -> bigquery.Client:
+# Columns the peer table actually consumes from BIGQUERY_TABLE_ALL.
+ALL_COLUMNS = ["code", "metric", "clean_value"]
+
+
+def _mount_http_adapter(client: bigquery.Client) -> None:
+    """
+    Widen the urllib3 connection pool on the client's HTTP session.
+
+    The default pool of 10 connections saturates under Streamlit reruns
+    plus concurrent Storage API streams ("Connection pool is full,
+    discarding connection"), forcing fresh TCP+TLS handshakes.
+    """
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=64, pool_maxsize=64, max_retries=3
+    )
+    client._http.mount("https://", adapter)
+
+    # The auth refresh transport keeps its own session; widen that too.
+    auth_request = getattr(client._http, "_auth_request", None)
+    if auth_request is not None:
+        auth_request.session.mount("https://", adapter)
+
+
+def _validate_creds() -> None:
     """
-    Create and return a BigQuery client.
+    Check the credentials configuration once, at import time, so a
+    misconfigured .env fails fast instead of on the first query — and
+    so the env lookups and stat() don't rerun on every Streamlit rerun.
     """
     creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-    print(f"[DEBUG] GOOGLE_APPLICATION_CREDENTIALS = {creds_path}")
 
-    # Extra safety: check that the file exists
     if not creds_path:
         raise RuntimeError(
             "GOOGLE_APPLICATION_CREDENTIALS is not set. "
@@ -49,38 +84,123 @@ def get_bigquery_client(project_id: str) -> bigquery.Client:
             "Use an absolute path in your .env."
         )
 
-    return bigquery.Client(project=project_id)
 
+_validate_creds()
 
-def get_data(
+_CLIENT_SINGLETON: Optional[bigquery.Client] = None
+
+
+def get_bigquery_client(project_id: str) -> bigquery.Client:
+    """
+    Return the process-wide BigQuery client, creating it on first use.
+    """
+    global _CLIENT_SINGLETON
+    if _CLIENT_SINGLETON is None:
+        client = bigquery.Client(project=project_id)
+        _mount_http_adapter(client)
+        _CLIENT_SINGLETON = client
+    return _CLIENT_SINGLETON
+
+
+_BQSTORAGE_CLIENT: Optional[bigquery_storage.BigQueryReadClient] = None
+
+
+def get_bqstorage_client() -> bigquery_storage.BigQueryReadClient:
+    """
+    Create (once) and return a BigQuery Storage read client.
+
+    Results are streamed as Arrow record batches instead of paging
+    through the REST API row by row, which is much faster for
+    large result sets.
+    """
+    global _BQSTORAGE_CLIENT
+    if _BQSTORAGE_CLIENT is None:
+        _BQSTORAGE_CLIENT = bigquery_storage.BigQueryReadClient()
+    return _BQSTORAGE_CLIENT
+
+
+def _start_query(
+    query: str,
+    query_parameters: list,
+    client: bigquery.Client
+) -> bigquery.QueryJob:
+    """
+    Kick off a query job without blocking.
+    client.query() returns immediately, so several jobs started
+    back-to-back run in parallel server-side.
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=query_parameters,
+        # Identical repeat queries are served from BigQuery's result
+        # cache (near-zero bytes scanned) instead of re-executing.
+        use_query_cache=True,
+    )
+    return client.query(query, job_config=job_config)
+
+
+def _finish_query(job: bigquery.QueryJob) -> pd.DataFrame:
+    """
+    Block until a query job completes and download its result.
+    Stream the result via the Storage API as Arrow batches and
+    convert zero-copy to pandas (no per-row JSON deserialization).
+    """
+    arrow_table = job.to_arrow(bqstorage_client=get_bqstorage_client())
+    return arrow_table.to_pandas()
+
+
+def _code_query_job(
     code: str,
     table: str,
-    client: Optional[bigquery.Client] = None
-) -> pd.DataFrame:
+    client: bigquery.Client,
+    columns: Optional[list[str]] = None,
+    year_range: Optional[tuple[int, int]] = None
+) -> bigquery.QueryJob:
     """
-    Generic helper:
-    Fetch data for a given stock code from a specific BigQuery table
+    Start a query for a given stock code against a specific table
     with a simple WHERE code = @code filter.
+
+    columns/year_range narrow the scan: BigQuery is columnar, so an
+    explicit SELECT list and a pushed-down year filter avoid moving
+    bytes the consumer would immediately discard.
     """
-    if client is None:
-        client = get_bigquery_client(PROJECT_ID)
+    select_list = ", ".join(columns) if columns else "*"
 
     query = f"""
-        SELECT *
+        SELECT {select_list}
         FROM `{table}`
         WHERE code = @code
     """
 
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("code", "STRING", code)
+    query_parameters = [bigquery.ScalarQueryParameter("code", "STRING", code)]
+
+    if year_range is not None:
+        query += " AND year BETWEEN @y0 AND @y1"
+        query_parameters += [
+            bigquery.ScalarQueryParameter("y0", "INT64", year_range[0]),
+            bigquery.ScalarQueryParameter("y1", "INT64", year_range[1]),
         ]
-    )
+
+    return _start_query(query, query_parameters, client)
+
+
+def get_data(
+    code: str,
+    table: str,
+    client: Optional[bigquery.Client] = None,
+    columns: Optional[list[str]] = None,
+    year_range: Optional[tuple[int, int]] = None
+) -> pd.DataFrame:
+    """
+    Generic helper:
+    Fetch data for a given stock code from a specific BigQuery table
+    with a simple WHERE code = @code filter, optionally narrowed to an
+    explicit column list and a year range.
+    """
+    if client is None:
+        client = get_bigquery_client(PROJECT_ID)
 
     try:
-        query_job = client.query(query, job_config=job_config)
-        df = query_job.to_dataframe()
-        return df
+        return _finish_query(_code_query_job(code, table, client, columns, year_range))
 
     except GoogleCloudError as e:
         print(f"[ERROR] BigQuery error while fetching data for code '{code}' from {table}: {e}")
@@ -91,6 +211,55 @@ def get_data(
         return pd.DataFrame()
 
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_classification() -> pd.DataFrame:
+    """
+    Ticker → sub_sector mapping from the classification table.
+    It is small and slow-changing, so it is fetched once an hour and
+    reused in-process instead of being re-joined inside every query.
+    """
+    client = get_bigquery_client(PROJECT_ID)
+    query = f"SELECT ticker, sub_sector FROM `{BIGQUERY_TABLE_CLASSIFICATION}`"
+    return _finish_query(_start_query(query, [], client))
+
+
+def subsector_tickers(code: str) -> list[str]:
+    """
+    All tickers sharing the given code's sub_sector, resolved from the
+    cached classification mapping.
+    """
+    cls = load_classification()
+    match = cls.loc[cls["ticker"] == code, "sub_sector"]
+    if match.empty:
+        return [code]
+    return cls.loc[cls["sub_sector"] == match.iat[0], "ticker"].tolist()
+
+
+def _subsector_query_job(
+    code: str,
+    client: bigquery.Client
+) -> bigquery.QueryJob:
+    """
+    Start a query against BIGQUERY_TABLE_ALL for ALL tickers
+    that are in the same sub_sector as the given code (ticker).
+
+    The ticker list is resolved client-side from the cached
+    classification mapping, so the query is a flat UNNEST filter
+    instead of a three-level nested subquery.
+    """
+    query = f"""
+        SELECT *
+        FROM `{BIGQUERY_TABLE_ALL}`
+        WHERE code IN UNNEST(@tickers)
+    """
+
+    return _start_query(
+        query,
+        [bigquery.ArrayQueryParameter("tickers", "STRING", subsector_tickers(code))],
+        client,
+    )
+
+
 def get_all_same_subsector(
     code: str,
     client: Optional[bigquery.Client] = None
@@ -103,30 +272,8 @@ def get_all_same_subsector(
     if client is None:
         client = get_bigquery_client(PROJECT_ID)
 
-    query = f"""
-        SELECT *
-        FROM `{BIGQUERY_TABLE_ALL}`
-        WHERE code IN (
-          SELECT ticker
-          FROM `{BIGQUERY_TABLE_CLASSIFICATION}`
-          WHERE sub_sector = (
-            SELECT sub_sector
-            FROM `{BIGQUERY_TABLE_CLASSIFICATION}`
-            WHERE ticker = @code
-          )
-        )
-    """
-
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("code", "STRING", code)
-        ]
-    )
-
     try:
-        query_job = client.query(query, job_config=job_config)
-        df = query_job.to_dataframe()
-        return df
+        return _finish_query(_subsector_query_job(code, client))
 
     except GoogleCloudError as e:
         print(f"[ERROR] BigQuery error while fetching ALL-table data for code '{code}': {e}")
@@ -145,17 +292,123 @@ def get_all_and_quarterly(
     Fetch data for a given stock code from BOTH:
     - BIGQUERY_TABLE_ALL (same-sub_sector logic)
     - BIGQUERY_TABLE_QUARTER (simple code filter)
+
+    Both scans are fused into a single UNION ALL query (tagged with a
+    'src' column and NULL-padded to a common schema), so one job
+    dispatch + one Arrow download covers both tables. The combined
+    result is split back into the two DataFrames locally.
     """
     if client is None:
         client = get_bigquery_client(PROJECT_ID)
 
-    # NEW LOGIC: use the sub-sector based query for the ALL table
-    df_all = get_all_same_subsector(code, client)
+    query = f"""
+        SELECT
+          'all' AS src,
+          code, metric, clean_value,
+          CAST(NULL AS INT64)   AS year,
+          CAST(NULL AS STRING)  AS quarter,
+          CAST(NULL AS STRING)  AS parameter,
+          CAST(NULL AS FLOAT64) AS value_final
+        FROM `{BIGQUERY_TABLE_ALL}`
+        WHERE code IN UNNEST(@tickers)
+        UNION ALL
+        SELECT
+          'quarter' AS src,
+          code,
+          CAST(NULL AS STRING)  AS metric,
+          CAST(NULL AS FLOAT64) AS clean_value,
+          year, quarter, parameter, value_final
+        FROM `{BIGQUERY_TABLE_QUARTER}`
+        WHERE code = @code
+    """
 
-    # OLD LOGIC: still just filter on code for the QUARTER table
-    df_quarter = get_data(code, BIGQUERY_TABLE_QUARTER, client)
+    try:
+        # subsector_tickers runs the classification query, so it belongs
+        # inside the same catch-and-return-empty contract as the fetch.
+        query_parameters = [
+            bigquery.ScalarQueryParameter("code", "STRING", code),
+            bigquery.ArrayQueryParameter("tickers", "STRING", subsector_tickers(code)),
+        ]
+
+        df = _finish_query(_start_query(query, query_parameters, client))
+
+        is_all = df["src"] == "all"
+        df_all = df.loc[is_all, ALL_COLUMNS].reset_index(drop=True)
+        df_quarter = df.loc[~is_all, QUARTERLY_COLUMNS].reset_index(drop=True)
+
+        return df_all, df_quarter
+
+    except GoogleCloudError as e:
+        print(f"[ERROR] BigQuery error while fetching ALL+QUARTER data for code '{code}': {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+    except Exception as e:
+        print(f"[ERROR] Unexpected error while fetching ALL+QUARTER data for code '{code}': {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+
+# In-flight fetches by code, so concurrent requests for the same ticker
+# share one BigQuery job instead of launching duplicates. Streamlit runs
+# each session on its own thread (and event loop), so the coalescing
+# uses concurrent.futures primitives guarded by a lock rather than
+# asyncio futures, which are bound to the loop that created them.
+_fetch_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="bq-fetch"
+)
+_inflight: dict[str, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
 
-    return df_all, df_quarter
+
+def _forget_inflight(code: str, fut: concurrent.futures.Future) -> None:
+    with _inflight_lock:
+        if _inflight.get(code) is fut:
+            del _inflight[code]
+
+
+async def get_all_and_quarterly_async(
+    code: str,
+    client: Optional[bigquery.Client] = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Async wrapper around get_all_and_quarterly.
+
+    The blocking fetch runs on a shared executor (the BigQuery client is
+    sync-only); if a fetch for the same code is already in flight, the
+    caller awaits that same future — safely, even from a different
+    event loop — rather than issuing a duplicate query.
+    """
+    with _inflight_lock:
+        fut = _inflight.get(code)
+        if fut is None:
+            fut = _fetch_executor.submit(get_all_and_quarterly, code, client)
+            fut.add_done_callback(
+                lambda f, code=code: _forget_inflight(code, f)
+            )
+            _inflight[code] = fut
+
+    return await asyncio.wrap_future(fut)
+
+
+# ---------- Streamlit-cached wrappers ---------- #
+# Streamlit reruns the whole script on every widget interaction, so the
+# app should go through these instead of hitting BigQuery directly.
+
+@st.cache_resource
+def cached_bq_client(project_id: str) -> bigquery.Client:
+    """
+    Return a BigQuery client shared across Streamlit reruns/sessions.
+    """
+    return get_bigquery_client(project_id)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_all_and_quarterly(code: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Cached version of get_all_and_quarterly, keyed by stock code.
+    Repeat reruns within the TTL skip the BigQuery round-trips entirely.
+    """
+    client = cached_bq_client(PROJECT_ID)
+    return get_all_and_quarterly(code, client)
 
 
 def main():
@@ -1,13 +1,16 @@
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 import streamlit as st
 import altair as alt
 
-from data_extraction import get_bigquery_client, get_all_and_quarterly, PROJECT_ID
+from src.data_extraction import cached_all_and_quarterly
 
 
 # ---------- Helpers for scaling numbers ---------- #
 
+@lru_cache(maxsize=None)
 def get_scale_and_unit(max_abs_value: float):
     """
     Given the maximum absolute value of a series, decide whether to scale by:
@@ -29,188 +32,244 @@ def get_scale_and_unit(max_abs_value: float):
         return 1.0, ""
 
 
-# ---------- Data extraction ---------- #
+@st.cache_data(ttl=600, show_spinner=False)
+def param_max_abs(code: str, parameter: str) -> float:
+    """
+    Max absolute value_final for one parameter of a stock code.
+    Cached so the full-column reduction doesn't rerun on every
+    Streamlit interaction; the TTL matches cached_all_and_quarterly so
+    the max can't outlive the data it was computed from.
+    """
+    _, df_quarter = cached_all_and_quarterly(code)
+    series = df_quarter.loc[df_quarter["parameter"] == parameter, "value_final"]
+    return float(series.abs().max())
 
-code = "CMRY"
 
-client = get_bigquery_client(PROJECT_ID)
-df_all, df_quarter = get_all_and_quarterly(code, client)
+def _prepare_chart_df(df_quarter: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filter to the charted years and derive quarter_num / period.
 
-# ---------- Prep data ---------- #
+    The window is the three most recent years present in the data,
+    derived from MAX(year) so new quarters keep appearing as they land
+    instead of freezing a calendar range.
+    """
+    if df_quarter.empty:
+        df = df_quarter.copy()
+    else:
+        latest = int(df_quarter["year"].max())
+        df = df_quarter[df_quarter["year"] >= latest - 2].copy()
 
-quarter_order = {"Q1": 1, "Q2": 2, "Q3": 3, "Q4": 4}
+    # Ordered categorical quarter: quarter_num falls out of the category
+    # codes as a single int8 buffer read, with no per-row dict lookup.
+    df["quarter"] = pd.Categorical(
+        df["quarter"], categories=["Q1", "Q2", "Q3", "Q4"], ordered=True
+    )
+    df["quarter_num"] = (df["quarter"].cat.codes + 1).astype("int8")
+
+    # Guard the empty window before deriving period codes: min() over no
+    # years would raise where callers expect a warning further down.
+    if df.empty:
+        df["period"] = pd.Categorical([], ordered=True)
+        return df
+
+    # Build "period" as an ordered categorical in one vectorized step:
+    # the category codes are derived arithmetically from (year, quarter),
+    # so there is no per-row string concat and no separate sort needed —
+    # the ordered categorical already carries the chronological order.
+    # The categories span a *contiguous* year range so a gap year (rows
+    # for 2023 and 2025 but none for 2024) still maps inside the list.
+    year = df["year"].to_numpy()
+    ymin, ymax = int(year.min()), int(year.max())
+    period_categories = [f"{y} Q{q}" for y in range(ymin, ymax + 1) for q in range(1, 5)]
+    period_codes = (year - ymin) * 4 + df["quarter_num"].to_numpy() - 1
+    df["period"] = pd.Categorical.from_codes(
+        period_codes, categories=period_categories, ordered=True
+    )
 
-df = df_quarter[df_quarter["year"].isin([2023, 2024, 2025])].copy()
-df["quarter_num"] = df["quarter"].map(quarter_order)
-df["period"] = df["year"].astype(str) + " " + df["quarter"]
+    # Narrow dtypes before the frame reaches Altair: float32 is plenty
+    # for display precision, and categoricals mean groupby/equality run
+    # on integer codes while the JSON payload stays small.
+    df = df.astype({
+        "value_final": "float32",
+        "parameter": "category",
+        "code": "category",
+    })
 
-df = df.sort_values(["year", "quarter_num"])
+    return df
 
-st.title(f"{code} Quarterly Fundamentals")
 
-params = sorted(df["parameter"].unique())
+def _line_chart(plot_df, x_axis, axis_title, color, orient=None):
+    """
+    One pre-filtered, pre-scaled line layer.
+    """
+    y_axis = alt.Axis(title=axis_title) if orient is None else alt.Axis(
+        title=axis_title, orient=orient
+    )
 
-# ---------- UI: parameter selectors in one row ---------- #
+    return (
+        alt.Chart(plot_df)
+        .mark_line(point=True)
+        .encode(
+            x=x_axis,
+            y=alt.Y("scaled_value:Q", axis=y_axis),
+            color=alt.value(color),
+            tooltip=[
+                alt.Tooltip("parameter:N", title="Parameter"),
+                alt.Tooltip("period:N", title="Period"),
+                alt.Tooltip("year:Q", title="Year"),
+                alt.Tooltip("quarter:N", title="Quarter"),
+                alt.Tooltip(
+                    "scaled_value:Q",
+                    title=axis_title,
+                    format=".2f",
+                ),
+            ],
+        )
+    )
 
-col1, col2 = st.columns(2)
 
-with col1:
-    left_param = st.selectbox(
-        "LEFT axis parameter",
-        params,
-        index=0,
-    )
+@st.cache_data(show_spinner=False)
+def build_chart_spec(code: str, left_param: str, right_param: str, n_rows: int):
+    """
+    Build the Vega-Lite spec and caption for a parameter selection.
 
-with col2:
-    right_param = st.selectbox(
-        "RIGHT axis parameter",
-        params,
-        index=1 if len(params) > 1 else 0,
-    )
+    Cached on (code, selection, row count): repeated renders of the same
+    selection skip the groupby, scaling and Altair spec traversal and go
+    straight to st.vega_lite_chart with the stored dict.
 
-# ---------- Button to trigger chart ---------- #
+    Returns:
+        (spec_dict, caption) on success, (None, warning_message) if one
+        of the requested parameters has no data.
+    """
+    _, df_quarter = cached_all_and_quarterly(code)
+    df = _prepare_chart_df(df_quarter)
 
-run = st.button("Generate chart")
+    period_order = df["period"].cat.categories.tolist()
 
-if not run:
-    st.info("Choose parameters, then click **Generate chart** to see the plot.")
-else:
-    base = alt.Chart(df).encode(
-        x=alt.X(
-            "period:N",
-            sort=list(df["period"].unique()),
-            title="Period",
-        )
+    x_axis = alt.X(
+        "period:N",
+        sort=period_order,
+        title="Period",
     )
 
+    # One pass over df instead of a full equality scan per parameter.
+    groups = {p: sub for p, sub in df.groupby("parameter", sort=False, observed=True)}
+    empty = df.iloc[:0]
+
+    plot_cols = ["period", "year", "quarter", "parameter", "value_final"]
+
     # ---------- Single-axis case (same parameter on both sides) ---------- #
     if left_param == right_param:
-        series_df = df[df["parameter"] == left_param]
+        series_df = groups.get(left_param, empty)
 
         if series_df.empty:
-            st.warning(f"No data available for parameter: {left_param}")
-        else:
-            max_abs = series_df["value_final"].abs().max()
-            scale, unit = get_scale_and_unit(max_abs)
-
-            axis_title = left_param if unit == "" else f"{left_param} ({unit})"
-
-            chart = (
-                base.transform_filter(
-                    alt.datum.parameter == left_param
-                )
-                .transform_calculate(
-                    scaled_value=f"datum.value_final / {scale}"
-                )
-                .mark_line(point=True)
-                .encode(
-                    y=alt.Y(
-                        "scaled_value:Q",
-                        axis=alt.Axis(title=axis_title),
-                    ),
-                    color=alt.value("#1f77b4"),
-                    tooltip=[
-                        alt.Tooltip("parameter:N", title="Parameter"),
-                        alt.Tooltip("period:N", title="Period"),
-                        alt.Tooltip("year:Q", title="Year"),
-                        alt.Tooltip("quarter:N", title="Quarter"),
-                        alt.Tooltip(
-                            "scaled_value:Q",
-                            title=axis_title,
-                            format=".2f",
-                        ),
-                    ],
-                )
-            )
-
-            st.write(f"Showing **{left_param}** over time (scaled to {unit or 'original units'}).")
-            st.altair_chart(chart, use_container_width=True)
+            return None, f"No data available for parameter: {left_param}"
+
+        max_abs = param_max_abs(code, left_param)
+        scale, unit = get_scale_and_unit(max_abs)
+
+        axis_title = left_param if unit == "" else f"{left_param} ({unit})"
+
+        # Filter + scale in pandas so Altair only ships the rows it
+        # plots and the browser does no per-row arithmetic.
+        plot_df = series_df[plot_cols].copy()
+        plot_df["scaled_value"] = plot_df["value_final"] / scale
+
+        chart = _line_chart(plot_df, x_axis, axis_title, "#1f77b4")
+
+        caption = f"Showing **{left_param}** over time (scaled to {unit or 'original units'})."
+        return chart.to_dict(), caption
 
     # ---------- Dual-axis case (different parameters) ---------- #
-    else:
-        left_df = df[df["parameter"] == left_param]
-        right_df = df[df["parameter"] == right_param]
-
-        if left_df.empty:
-            st.warning(f"No data available for LEFT parameter: {left_param}")
-        if right_df.empty:
-            st.warning(f"No data available for RIGHT parameter: {right_param}")
-
-        if left_df.empty or right_df.empty:
-            st.stop()
-
-        # Decide scaling for each axis
-        max_left = left_df["value_final"].abs().max()
-        max_right = right_df["value_final"].abs().max()
-
-        scale_left, unit_left = get_scale_and_unit(max_left)
-        scale_right, unit_right = get_scale_and_unit(max_right)
-
-        axis_title_left = left_param if unit_left == "" else f"{left_param} ({unit_left})"
-        axis_title_right = right_param if unit_right == "" else f"{right_param} ({unit_right})"
-
-        left_line = (
-            base.transform_filter(
-                alt.datum.parameter == left_param
-            )
-            .transform_calculate(
-                scaled_value=f"datum.value_final / {scale_left}"
-            )
-            .mark_line(point=True)
-            .encode(
-                y=alt.Y(
-                    "scaled_value:Q",
-                    axis=alt.Axis(title=axis_title_left),
-                ),
-                color=alt.value("#1f77b4"),
-                tooltip=[
-                    alt.Tooltip("parameter:N", title="Parameter"),
-                    alt.Tooltip("period:N", title="Period"),
-                    alt.Tooltip("year:Q", title="Year"),
-                    alt.Tooltip("quarter:N", title="Quarter"),
-                    alt.Tooltip(
-                        "scaled_value:Q",
-                        title=axis_title_left,
-                        format=".2f",
-                    ),
-                ],
-            )
-        )
+    left_df = groups.get(left_param, empty)
+    right_df = groups.get(right_param, empty)
 
-        right_line = (
-            base.transform_filter(
-                alt.datum.parameter == right_param
-            )
-            .transform_calculate(
-                scaled_value=f"datum.value_final / {scale_right}"
-            )
-            .mark_line(point=True)
-            .encode(
-                y=alt.Y(
-                    "scaled_value:Q",
-                    axis=alt.Axis(title=axis_title_right, orient="right"),
-                ),
-                color=alt.value("#ff7f0e"),
-                tooltip=[
-                    alt.Tooltip("parameter:N", title="Parameter"),
-                    alt.Tooltip("period:N", title="Period"),
-                    alt.Tooltip("year:Q", title="Year"),
-                    alt.Tooltip("quarter:N", title="Quarter"),
-                    alt.Tooltip(
-                        "scaled_value:Q",
-                        title=axis_title_right,
-                        format=".2f",
-                    ),
-                ],
-            )
-        )
+    if left_df.empty:
+        return None, f"No data available for LEFT parameter: {left_param}"
+    if right_df.empty:
+        return None, f"No data available for RIGHT parameter: {right_param}"
+
+    # Decide scaling for each axis
+    max_left = param_max_abs(code, left_param)
+    max_right = param_max_abs(code, right_param)
+
+    scale_left, unit_left = get_scale_and_unit(max_left)
+    scale_right, unit_right = get_scale_and_unit(max_right)
+
+    axis_title_left = left_param if unit_left == "" else f"{left_param} ({unit_left})"
+    axis_title_right = right_param if unit_right == "" else f"{right_param} ({unit_right})"
+
+    # Pre-filter + pre-scale in pandas; each layer gets only its own
+    # narrow frame instead of the whole df plus Vega transforms.
+    left_plot = left_df[plot_cols].copy()
+    left_plot["scaled_value"] = left_plot["value_final"] / scale_left
+
+    right_plot = right_df[plot_cols].copy()
+    right_plot["scaled_value"] = right_plot["value_final"] / scale_right
+
+    left_line = _line_chart(left_plot, x_axis, axis_title_left, "#1f77b4")
+    right_line = _line_chart(right_plot, x_axis, axis_title_right, "#ff7f0e", orient="right")
+
+    chart = alt.layer(left_line, right_line).resolve_scale(
+        y="independent"  # separate y-scales for left/right axes
+    )
+
+    caption = (
+        f"Showing **{left_param}** (left axis, scaled to {unit_left or 'original units'}) "
+        f"and **{right_param}** (right axis, scaled to {unit_right or 'original units'})."
+    )
+    return chart.to_dict(), caption
 
-        chart = alt.layer(left_line, right_line).resolve_scale(
-            y="independent"  # separate y-scales for left/right axes
+
+def plot_quarterly(code: str, df_quarter: pd.DataFrame) -> None:
+    """
+    Render the quarterly fundamentals page for a stock code, using the
+    already-fetched df_quarter (no BigQuery calls from this module).
+    """
+    st.title(f"{code} Quarterly Fundamentals")
+
+    # Selector options come straight off df_quarter; the year filter and
+    # period derivation in _prepare_chart_df wait until the user actually
+    # asks for a chart, so reruns before that only pay for the unique().
+    params = sorted(df_quarter["parameter"].unique())
+
+    # ---------- UI: parameter selectors in one row ---------- #
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        left_param = st.selectbox(
+            "LEFT axis parameter",
+            params,
+            index=0,
         )
 
-        st.write(
-            f"Showing **{left_param}** (left axis, scaled to {unit_left or 'original units'}) "
-            f"and **{right_param}** (right axis, scaled to {unit_right or 'original units'})."
+    with col2:
+        right_param = st.selectbox(
+            "RIGHT axis parameter",
+            params,
+            index=1 if len(params) > 1 else 0,
         )
-        st.altair_chart(chart, use_container_width=True)
+
+    # ---------- Button to trigger chart ---------- #
+
+    run = st.button("Generate chart")
+
+    if not run:
+        st.info("Choose parameters, then click **Generate chart** to see the plot.")
+        return
+
+    spec, caption = build_chart_spec(code, left_param, right_param, len(df_quarter))
+
+    if spec is None:
+        st.warning(caption)
+        return
+
+    st.write(caption)
+    st.vega_lite_chart(spec, use_container_width=True)
+
+
+if __name__ == "__main__":
+    code = "CMRY"
+    df_all, df_quarter = cached_all_and_quarterly(code)
+    plot_quarterly(code, df_quarter)
@@ -1,28 +1,89 @@
-import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import orjson
 import plotly.graph_objects as go
 
+
+@lru_cache(maxsize=64)
+def _load_json(path: str, mtime: float) -> dict:
+    """
+    Parse a payload JSON once per (path, mtime). Having the mtime in the
+    cache key means an updated file busts the entry automatically.
+    orjson decodes in native code, several times faster than stdlib json.
+    """
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+# x-positions of the fixed nodes (Revenue ... Net profit); the
+# segment nodes are prepended at 0.05 per call.
+_FIXED_X_POS = (0.25, 0.45, 0.45, 0.65, 0.65, 0.82, 0.98, 0.98)
+
+# Invariant styling, built once at import instead of per figure.
+_SEGMENT_COLOR = 'rgba(128, 128, 128, 0.8)'
+_FIXED_NODE_COLORS = (
+    'rgba(128, 128, 128, 0.8)',  # Revenue
+    'rgba(220, 20, 60, 0.8)',    # COGS
+    'rgba(46, 139, 87, 0.8)',    # GP
+    'rgba(220, 20, 60, 0.8)',    # Opex
+    'rgba(46, 139, 87, 0.8)',    # EBIT
+    'rgba(46, 139, 87, 0.8)',    # PBT
+    'rgba(220, 20, 60, 0.8)',    # Tax
+    'rgba(46, 139, 87, 0.8)',    # Net profit
+)
+
+_SEGMENT_LINK_COLOR = 'rgba(180, 180, 180, 0.4)'   # segments → revenue
+_FIXED_LINK_COLORS = (
+    'rgba(255, 182, 193, 0.4)',  # Revenue → COGS
+    'rgba(144, 238, 144, 0.4)',  # Revenue → GP
+    'rgba(255, 182, 193, 0.4)',  # GP → Opex
+    'rgba(144, 238, 144, 0.4)',  # GP → EBIT
+    'rgba(144, 238, 144, 0.4)',  # EBIT → PBT
+    'rgba(255, 182, 193, 0.4)',  # PBT → Tax
+    'rgba(144, 238, 144, 0.4)',  # PBT → Net profit
+)
+
+_NODE_HOVER_TEMPLATE = '%{label}<extra></extra>'
+
+
 def plot_income_sankey(company_code: str, base_path: str = "output"):
     """
     Plot an income-statement Sankey diagram for a company, with
     percentages shown in the node labels.
     """
-    # ---------- Load JSON ----------
     json_path = f"{base_path}/{company_code}.json"
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    cached = _build_income_sankey(json_path, os.path.getmtime(json_path))
+    # Hand back a copy so callers can mutate their figure without
+    # poisoning the cached one.
+    return go.Figure(cached)
+
+
+@lru_cache(maxsize=64)
+def _build_income_sankey(json_path: str, mtime: float) -> go.Figure:
+    """
+    Build the sankey figure once per (payload path, mtime); an updated
+    payload file busts the entry automatically.
+    """
+    # ---------- Load JSON ----------
+    data = _load_json(json_path, mtime)
 
     table = data["table"]
     meta  = data["meta"]
 
     # ---------- Helpers ----------
-    def get_row(anchor):
-        for row in table:
-            if row["anchor"] == anchor:
-                return row
-        raise ValueError(f"Row not found for anchor={anchor}")
+    # Index the table once; every anchor lookup after this is O(1)
+    # instead of a fresh scan over all rows.
+    by_anchor = {}
+    for row in table:
+        by_anchor.setdefault(row["anchor"], []).append(row)
 
-    def get_rows_by_anchor(anchor):
-        return [row for row in table if row["anchor"] == anchor]
+    def get_row(anchor):
+        try:
+            return by_anchor[anchor][0]
+        except KeyError:
+            raise ValueError(f"Row not found for anchor={anchor}") from None
 
     # Core rows (by anchor, so it's company-agnostic)
     rev_row   = get_row("REV_TOTAL")
@@ -34,7 +95,7 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
     tax_row   = get_row("TAX_EXPENSE")
     net_row   = get_row("NET_PROFIT_TOTAL")
 
-    segments  = get_rows_by_anchor("REV_BREAKDOWN_SEGMENT")
+    segments  = by_anchor.get("REV_BREAKDOWN_SEGMENT", [])
 
     # Values (current period)
     rev_total  = rev_row["current"]
@@ -78,41 +139,24 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
     idx_np   = n_seg + 7
 
     # ---------- Flows ----------
-    flows = []
-
-    # Segments → Revenue (if any)
-    for i, seg in enumerate(segments):
-        flows.append((i, idx_rev, seg["current"]))
-
-    # Revenue → COGS & GP
-    flows.append((idx_rev, idx_cogs, cogs))
-    flows.append((idx_rev, idx_gp, gp))
-
-    # GP → Opex & EBIT
-    flows.append((idx_gp, idx_opex, opex_total))
-    flows.append((idx_gp, idx_ebit, ebit))
-
-    # EBIT → PBT (aggregating below-EBIT for simplicity)
-    flows.append((idx_ebit, idx_pbt, pbt))
-
-    # PBT → Tax & Net profit
-    flows.append((idx_pbt, idx_tax, tax))
-    flows.append((idx_pbt, idx_np, net_profit))
-
-    source = [f[0] for f in flows]
-    target = [f[1] for f in flows]
-    value  = [f[2] for f in flows]
+    # source/target/value are built directly: segments → Revenue first,
+    # then the fixed links Revenue → COGS/GP, GP → Opex/EBIT,
+    # EBIT → PBT, PBT → Tax/Net profit. No intermediate tuple list to
+    # split into three passes afterwards.
+    source = list(range(n_seg)) + [idx_rev, idx_rev, idx_gp, idx_gp, idx_ebit, idx_pbt, idx_pbt]
+    target = [idx_rev] * n_seg + [idx_cogs, idx_gp, idx_opex, idx_ebit, idx_pbt, idx_tax, idx_np]
+    value  = [seg["current"] for seg in segments] + [cogs, gp, opex_total, ebit, pbt, tax, net_profit]
 
     # ---------- Layout ----------
     # Segments on far left, spaced vertically if present
     if n_seg > 1:
-        y_seg = [0.2 + i * (0.6 / (n_seg - 1)) for i in range(n_seg)]
+        y_seg = np.linspace(0.2, 0.8, n_seg).tolist()
     elif n_seg == 1:
         y_seg = [0.4]
     else:
         y_seg = []
 
-    x_pos = [0.05] * n_seg + [0.25, 0.45, 0.45, 0.65, 0.65, 0.82, 0.98, 0.98]
+    x_pos = [0.05] * n_seg + list(_FIXED_X_POS)
     y_pos = (
         y_seg
         + [
@@ -128,30 +172,8 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
     )
 
     # ---------- Colors ----------
-    segment_color = 'rgba(128, 128, 128, 0.8)'
-    node_colors = [segment_color] * n_seg + [
-        'rgba(128, 128, 128, 0.8)',  # Revenue
-        'rgba(220, 20, 60, 0.8)',    # COGS
-        'rgba(46, 139, 87, 0.8)',    # GP
-        'rgba(220, 20, 60, 0.8)',    # Opex
-        'rgba(46, 139, 87, 0.8)',    # EBIT
-        'rgba(46, 139, 87, 0.8)',    # PBT
-        'rgba(220, 20, 60, 0.8)',    # Tax
-        'rgba(46, 139, 87, 0.8)',    # Net profit
-    ]
-
-    link_colors = (
-        ['rgba(180, 180, 180, 0.4)'] * n_seg  # segments → revenue
-        + [
-            'rgba(255, 182, 193, 0.4)',  # Revenue → COGS
-            'rgba(144, 238, 144, 0.4)',  # Revenue → GP
-            'rgba(255, 182, 193, 0.4)',  # GP → Opex
-            'rgba(144, 238, 144, 0.4)',  # GP → EBIT
-            'rgba(144, 238, 144, 0.4)',  # EBIT → PBT
-            'rgba(255, 182, 193, 0.4)',  # PBT → Tax
-            'rgba(144, 238, 144, 0.4)',  # PBT → Net profit
-        ]
-    )
+    node_colors = [_SEGMENT_COLOR] * n_seg + list(_FIXED_NODE_COLORS)
+    link_colors = [_SEGMENT_LINK_COLOR] * n_seg + list(_FIXED_LINK_COLORS)
 
     # ---------- Formatting helpers ----------
     def format_value(val):
@@ -164,10 +186,15 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
         return 100.0 * num / denom
 
     # ---------- Node values + percentages (vs previous node) ----------
-    node_values = [0] * len(nodes)
-    for s, t, v in flows:
-        node_values[s] = max(node_values[s], v)
-        node_values[t] = max(node_values[t], v)
+    # Per-node max over incoming/outgoing links as two scatter-max
+    # passes in NumPy instead of a Python loop.
+    src = np.asarray(source)
+    tgt = np.asarray(target)
+    val = np.asarray(value, dtype=np.float64)
+
+    node_values = np.zeros(len(nodes))
+    np.maximum.at(node_values, src, val)
+    np.maximum.at(node_values, tgt, val)
 
     # Precompute percentages relative to the *previous* node:
     # - Segments: vs total revenue
@@ -216,27 +243,24 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
     if p_np is not None:
         pct_text[idx_np] = f"{p_np:.1f}% of PBT"
 
-    # Build final labels (always visible on the chart)
-    labels = []
-    for i, name in enumerate(nodes):
-        value_str = format_value(node_values[i])
-        pct_str   = pct_text[i]
-        if pct_str:
-            label = f"<b>{name}</b><br>{value_str}<br>{pct_str}"
-        else:
-            label = f"<b>{name}</b><br>{value_str}"
-        labels.append(label)
+    # Build final labels (always visible on the chart). The pct entries
+    # get their leading <br> first, so assembly is one branch-free pass.
+    pct_suffix = [f"<br>{p}" if p else "" for p in pct_text]
+    labels = [
+        f"<b>{name}</b><br>{format_value(v)}{s}"
+        for name, v, s in zip(nodes, node_values, pct_suffix)
+    ]
 
     # ---------- Link-level percentages (in hover) ----------
-    # % of source node for each link
-    total_out = {}
-    for s, v in zip(source, value):
-        total_out[s] = total_out.get(s, 0) + v
-
-    link_pct = []
-    for s, v in zip(source, value):
-        p = pct(v, total_out[s]) if total_out.get(s) else None
-        link_pct.append(p if p is not None else 0.0)
+    # % of source node for each link: per-source sums via bincount,
+    # then one vectorized divide guarded against zero totals.
+    total_out = np.bincount(src, weights=val, minlength=len(nodes))
+    link_pct = np.divide(
+        100.0 * val,
+        total_out[src],
+        out=np.zeros_like(val),
+        where=total_out[src] != 0,
+    ).tolist()
 
     # ---------- Build Sankey ----------
     fig = go.Figure(data=[go.Sankey(
@@ -250,7 +274,7 @@ def plot_income_sankey(company_code: str, base_path: str = "output"):
             color=node_colors,
             x=x_pos,
             y=y_pos,
-            hovertemplate='%{label}<extra></extra>'
+            hovertemplate=_NODE_HOVER_TEMPLATE
         ),
         link=dict(
             source=source,
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from data_extraction import *
+import numpy as np
+from src.data_extraction import get_bigquery_client, get_all_and_quarterly, PROJECT_ID
 
 code = "CMRY"
 
@@ -8,14 +9,29 @@ client = get_bigquery_client(PROJECT_ID)
 
 df_all, df_quarter = get_all_and_quarterly(code, client)
 
-category = df_all[(df_all['metric']=='market_cap')&
-                     (df_all['code']!=code)][['code','clean_value']]\
-                            .drop_duplicates().sort_values('clean_value', ascending = False).head(5)['code'].unique()
+# Top-5 peers by market cap: dedupe per code (keeping its highest
+# value) BEFORE truncating so repeated market_cap rows can't crowd a
+# single code into several slots, and pivot_table(aggfunc='first')
+# absorbs the second drop_duplicates so df_all is only scanned twice
+# instead of four times.
+top5 = (
+    df_all.loc[(df_all['metric'] == 'market_cap') & (df_all['code'] != code),
+               ['code', 'clean_value']]
+    .sort_values('clean_value', ascending=False)
+    .drop_duplicates('code')
+    .head(5)['code']
+    .tolist()
+)
 
-category = [code] + list(category)
+category = [code, *top5]
 
-df_all_filtered = df_all[df_all['code'].isin(category)][['code','metric','clean_value']].drop_duplicates()
-df = df_all_filtered.pivot(index = 'metric', columns = 'code', values = 'clean_value')
+df_all_filtered = df_all.loc[df_all['code'].isin(category),
+                             ['code', 'metric', 'clean_value']].copy()
+df_all_filtered['code'] = df_all_filtered['code'].astype('category')
+df = df_all_filtered.pivot_table(
+    index='metric', columns='code', values='clean_value',
+    aggfunc='first', observed=True,
+)
 
 core_metrics_in_order = [
     # QUALITY
@@ -57,6 +73,10 @@ metrics_available = [m for m in core_metrics_in_order if m in df.index]
 
 df_core = df.loc[metrics_available].copy()
 
+# float32 is enough for display precision and halves the Arrow payload
+# Streamlit serializes for the browser.
+df_core = df_core.astype(np.float32)
+
 # -------------------------------------------------------------------
 # 2. Map each metric to a segment for highlighting
 # -------------------------------------------------------------------
@@ -107,48 +127,74 @@ segment_colors = {
 # -------------------------------------------------------------------
 # 3. Formatting function for big numbers (K, M, B, T)
 # -------------------------------------------------------------------
-def human_format(x):
-    """Format numbers into K / M / B / T, keep small numbers as decimals."""
-    if pd.isna(x):
-        return ""
-    # If it's not a number, just return as is
-    if not isinstance(x, (int, float)):
-        return x
-
-    abs_x = abs(x)
-
-    if abs_x >= 1e12:
-        return f"{x / 1e12:.2f}T"
-    elif abs_x >= 1e9:
-        return f"{x / 1e9:.2f}B"
-    elif abs_x >= 1e6:
-        return f"{x / 1e6:.2f}M"
-    elif abs_x >= 1e3:
-        return f"{x / 1e3:.2f}K"
-    else:
-        # for ratios/percents like 0.24, 0.05, etc.
-        return f"{x:.4f}".rstrip("0").rstrip(".")  # tidy up trailing zeros
+def human_format_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized human_format: format a whole numeric frame into
+    K / M / B / T strings, keeping small numbers as decimals.
+
+    The magnitude bucketing and scaling run as NumPy masks over the
+    full array instead of one Python call per cell.
+    """
+    a = df.to_numpy(dtype=float)
+    abs_a = np.abs(a)
+
+    m_t = abs_a >= 1e12
+    m_b = (abs_a >= 1e9) & ~m_t
+    m_m = (abs_a >= 1e6) & ~(m_t | m_b)
+    m_k = (abs_a >= 1e3) & ~(m_t | m_b | m_m)
+
+    scaled = np.select([m_t, m_b, m_m, m_k], [a / 1e12, a / 1e9, a / 1e6, a / 1e3], default=a)
+    suffix = np.select([m_t, m_b, m_m, m_k], ["T", "B", "M", "K"], default="")
+
+    nan_mask = np.isnan(a)
+    big = m_t | m_b | m_m | m_k
+
+    # The K/M/B/T path composes entirely in NumPy's string kernels;
+    # only the small-ratio cells (and NaNs) are patched afterwards.
+    formatted = np.char.add(
+        np.char.mod("%.2f", np.nan_to_num(scaled)), suffix
+    ).astype(object)
+
+    small = ~big & ~nan_mask
+    formatted[small] = [
+        # for ratios/percents like 0.24, 0.05, etc. — tidy trailing zeros
+        f"{v:.4f}".rstrip("0").rstrip(".") for v in scaled[small]
+    ]
+    formatted[nan_mask] = ""
+
+    return pd.DataFrame(formatted, index=df.index, columns=df.columns)
 
 # -------------------------------------------------------------------
-# 4. Row-wise style function to highlight segments
+# 4. Precomputed CSS frame to highlight segments
 # -------------------------------------------------------------------
-def highlight_segments(row):
-    metric = row.name
-    segment = metric_to_segment.get(metric, None)
-    color = segment_colors.get(segment, "")
-    if color:
-        return [f"background-color: {color}" for _ in row]
-    else:
-        return ["" for _ in row]
+# One lookup chain per row plus a broadcast over the columns, instead
+# of a Python styling callback invoked per row.
+seg_colors = (
+    df_core.index.to_series()
+    .map(metric_to_segment)
+    .map(segment_colors)
+    .fillna("")
+    .to_numpy()
+)
+row_css = np.array(
+    [f"background-color: {c}" if c else "" for c in seg_colors],
+    dtype=object,
+)
+css_df = pd.DataFrame(
+    np.broadcast_to(row_css[:, None], df_core.shape),
+    index=df_core.index,
+    columns=df_core.columns,
+)
 
 # -------------------------------------------------------------------
 # 5. Build the Styler with formatting + segment highlighting
 # -------------------------------------------------------------------
+df_display = human_format_frame(df_core)
+
 styled = (
-    df_core
+    df_display
     .style
-    .format(human_format)
-    .apply(highlight_segments, axis=1)
+    .apply(lambda _: css_df, axis=None)
 )
 
 # -------------------------------------------------------------------
@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import List, Dict, Any
-import json
 
+import orjson
 import pandas as pd
 import streamlit as st
 
@@ -55,14 +55,33 @@ def hero_section(CODES: List[str]) -> str:
     return code, process
 
 
+@st.cache_data(show_spinner=False)
+def _load_payload(path: str, mtime: float) -> Dict[str, Any]:
+    """
+    Parse a payload JSON once per (path, mtime); reruns for an unchanged
+    file are served from the cache instead of re-reading the disk.
+    """
+    return orjson.loads(Path(path).read_bytes())
+
+
 def load_payload(data_dir: Path, code: str) -> tuple[pd.DataFrame, List[str], Dict[str, Any]]:
-    payload = json.loads((data_dir / f"{code}.json").read_text(encoding="utf-8"))
+    path = data_dir / f"{code}.json"
+    payload = _load_payload(str(path), path.stat().st_mtime)
     table = pd.DataFrame(payload["table"])
     summary = payload.get("summary", [])
     meta = payload.get("meta", {})
     return table, summary, meta
 
 
+@st.cache_resource(show_spinner=False)
+def _cached_sankey_fig(code: str, mtime: float):
+    """
+    Build the sankey figure once per (code, payload mtime); Streamlit
+    reruns reuse the stored figure instead of rebuilding it.
+    """
+    return plot_income_sankey(code)
+
+
 def sankey_section(code: str) -> None:
     st.markdown(
         """
@@ -73,7 +92,8 @@ def sankey_section(code: str) -> None:
         """,
         unsafe_allow_html=True,
     )
-    fig = plot_income_sankey(code)
+    mtime = (Path("output") / f"{code}.json").stat().st_mtime
+    fig = _cached_sankey_fig(code, mtime)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -107,12 +127,10 @@ def commentary_and_snapshot(summary: List[str], meta: Dict[str, Any]) -> None:
 
     # ---------- RIGHT: Commentary card (all inside one box) ----------
     with right_col:
-        # Build the list items
+        # Build the list items in one join instead of a generator of
+        # per-item f-strings.
         if isinstance(summary, list) and summary:
-            items_html = "".join(
-                f"<li>{s}</li>"
-                for s in summary
-            )
+            items_html = "<li>" + "</li><li>".join(map(str, summary)) + "</li>"
         else:
             items_html = """
                 <li style='color:#6b7280;'>No summary provided.</li>
@@ -1,5 +1,7 @@
+import pandas as pd
 import streamlit as st
-import altair as alt
+
+_VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
 
 
 def get_scale_and_unit(max_abs_value: float):
@@ -17,6 +19,52 @@ def get_scale_and_unit(max_abs_value: float):
         return 1.0, ""
 
 
+def _line_layer(plot_df, period_order, axis_title, color_domain, color_range, orient=None):
+    """
+    Hand-built Vega-Lite layer for one line series. Emitting the dict
+    directly skips Altair's schemapi validation and to_dict pass, which
+    dominate chart-build latency.
+    """
+    y_axis = {"title": axis_title}
+    if orient:
+        y_axis["orient"] = orient
+    return {
+        "data": {"values": plot_df.to_dict("records")},
+        "mark": {"type": "line", "point": True},
+        "encoding": {
+            "x": {
+                "field": "period",
+                "type": "nominal",
+                "sort": period_order,
+                "title": "Period",
+            },
+            "y": {
+                "field": "scaled_value",
+                "type": "quantitative",
+                "axis": y_axis,
+            },
+            "color": {
+                "field": "metric",
+                "type": "nominal",
+                "scale": {"domain": color_domain, "range": color_range},
+                "legend": {"title": "Metric"},
+            },
+            "tooltip": [
+                {"field": "metric", "type": "nominal", "title": "Metric"},
+                {"field": "period", "type": "nominal", "title": "Period"},
+                {"field": "year", "type": "quantitative", "title": "Year"},
+                {"field": "quarter", "type": "nominal", "title": "Quarter"},
+                {
+                    "field": "scaled_value",
+                    "type": "quantitative",
+                    "title": axis_title,
+                    "format": ".2f",
+                },
+            ],
+        },
+    }
+
+
 def _choose_default_index(params, preferred_names, fallback_idx):
     """
     Given a sorted list of parameter names and a list of preferred names,
@@ -32,31 +80,50 @@ def _choose_default_index(params, preferred_names, fallback_idx):
     return max(0, min(fallback_idx, len(params) - 1))
 
 
-def quarterly_fundamental_chart(code: str, df_quarter):
+@st.cache_data(
+    show_spinner=False,
+    hash_funcs={pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=True).sum()},
+)
+def _prepare_quarterly_df(code: str, df_quarter: pd.DataFrame):
     """
-    Render a dual-axis quarterly fundamentals chart for the given stock code,
-    using the provided df_quarter dataframe.
+    Derive the chart frame, parameter list and default selector indexes
+    for one code. Cached so reruns (tab flips, unrelated widget changes)
+    skip the copy, sort and unique work.
     """
-    st.subheader("Quarterly Fundamentals Chart")
-
-    if df_quarter is None or df_quarter.empty:
-        st.warning(f"No quarterly data found for {code}.")
-        return
-
-    # ---------- Prep data ---------- #
-    quarter_order = {"Q1": 1, "Q2": 2, "Q3": 3, "Q4": 4}
-
-    df = df_quarter.copy()
-    df["quarter_num"] = df["quarter"].map(quarter_order)
-    df["period"] = df["year"].astype(str) + " " + df["quarter"]
-    df = df.sort_values(["year", "quarter_num"])
+    # Assemble a fresh frame holding only the columns the chart uses,
+    # instead of copying df_quarter wholesale and mutating the copy.
+    # Narrow dtypes along the way: categoricals for the low-cardinality
+    # string columns and a downcast float cut both memory and the
+    # serialization cost of whatever reaches the chart.
+    quarter = pd.Categorical(
+        df_quarter["quarter"], categories=["Q1", "Q2", "Q3", "Q4"], ordered=True
+    )
+    year = df_quarter["year"].to_numpy()
+
+    # Ordered categorical period: the chronological order lives in the
+    # categories themselves, so no sort_values pass is needed and the
+    # x-axis sort below is just the category list.
+    ymin, ymax = int(year.min()), int(year.max())
+    period_cats = [f"{y} Q{q}" for y in range(ymin, ymax + 1) for q in range(1, 5)]
+    period_codes = (year - ymin) * 4 + quarter.codes
+
+    df = pd.DataFrame(
+        {
+            "year": year,
+            "quarter": quarter,
+            "parameter": pd.Categorical(df_quarter["parameter"]),
+            "value_final": pd.to_numeric(
+                df_quarter["value_final"].to_numpy(), downcast="float"
+            ),
+            "period": pd.Categorical.from_codes(
+                period_codes, categories=period_cats, ordered=True
+            ),
+        }
+    )
 
     params = sorted(df["parameter"].unique())
-    if not params:
-        st.warning("No parameters available to plot.")
-        return
 
-    # ---------- Default selections: Revenue (left) & Net Income (right) ---------- #
+    # Default selections: Revenue (left) & Net Income (right).
     # Try to match typical names; gracefully fall back if not present.
     left_default_idx = _choose_default_index(
         params,
@@ -67,7 +134,7 @@ def quarterly_fundamental_chart(code: str, df_quarter):
     right_default_idx = _choose_default_index(
         params,
         preferred_names=["Net Income", "Net income", "Net profit", "Profit for the period"],
-        fallback_idx=min(1, len(params) - 1),
+        fallback_idx=min(1, len(params) - 1) if params else 0,
     )
 
     # If by chance both defaults resolve to the same index and we have >1 param,
@@ -75,6 +142,36 @@ def quarterly_fundamental_chart(code: str, df_quarter):
     if right_default_idx == left_default_idx and len(params) > 1:
         right_default_idx = (left_default_idx + 1) % len(params)
 
+    return df, params, left_default_idx, right_default_idx
+
+
+def quarterly_fundamental_chart(code: str, df_quarter):
+    """
+    Render a dual-axis quarterly fundamentals chart for the given stock code,
+    using the provided df_quarter dataframe.
+    """
+    st.subheader("Quarterly Fundamentals Chart")
+
+    if df_quarter is None or df_quarter.empty:
+        st.warning(f"No quarterly data found for {code}.")
+        return
+
+    df, params, left_default_idx, right_default_idx = _prepare_quarterly_df(code, df_quarter)
+
+    if not params:
+        st.warning("No parameters available to plot.")
+        return
+
+    _chart_fragment(code, df, params, left_default_idx, right_default_idx)
+
+
+@st.fragment
+def _chart_fragment(code: str, df: pd.DataFrame, params, left_default_idx, right_default_idx):
+    """
+    Selectors plus chart build, scoped as a fragment: changing an axis
+    parameter reruns only this block instead of the whole page (table
+    rendering included).
+    """
     # ---------- UI: parameter selectors in one row ---------- #
     col1, col2 = st.columns(2)
 
@@ -94,17 +191,30 @@ def quarterly_fundamental_chart(code: str, df_quarter):
             key=f"{code}_right_param",
         )
 
-    base = alt.Chart(df).encode(
-        x=alt.X(
-            "period:N",
-            sort=list(df["period"].unique()),
-            title="Period",
-        )
-    )
+    # Short-circuit: if the selection (and data) is unchanged since the
+    # last rerun, replay the stored spec instead of re-encoding it.
+    cache_key = (code, left_param, right_param, len(df))
+    cached = st.session_state.get("_qfc_cache")
+    if cached is not None and cached[0] == cache_key:
+        _, cached_spec, cached_caption = cached
+        st.write(cached_caption)
+        st.vega_lite_chart(cached_spec, use_container_width=True)
+        return
+
+    period_order = list(df["period"].cat.categories)
+
+    # Columns each layer actually plots; filtering and scaling happen in
+    # pandas below, so Altair ships only these rows/columns and Vega
+    # runs no per-row transforms.
+    plot_cols = ["period", "year", "quarter", "metric", "scaled_value"]
+
+    # One pass strips every row the chart cannot use; the per-layer
+    # splits below scan this much smaller frame.
+    needed = df[df["parameter"].isin({left_param, right_param})]
 
     # ---------- Single-axis case (same parameter both sides) ---------- #
     if left_param == right_param:
-        series_df = df[df["parameter"] == left_param]
+        series_df = needed
 
         if series_df.empty:
             st.warning(f"No data available for parameter: {left_param}")
@@ -115,48 +225,31 @@ def quarterly_fundamental_chart(code: str, df_quarter):
         axis_title = left_param if unit == "" else f"{left_param} ({unit})"
 
         # Add a synthetic 'metric' field for color/legend
-        chart = (
-            base.transform_filter(
-                alt.datum.parameter == left_param
-            )
-            .transform_calculate(
-                scaled_value=f"datum.value_final / {scale}",
-                metric=f"'{left_param}'",
-            )
-            .mark_line(point=True)
-            .encode(
-                y=alt.Y(
-                    "scaled_value:Q",
-                    axis=alt.Axis(title=axis_title),
-                ),
-                color=alt.Color(
-                    "metric:N",
-                    scale=alt.Scale(
-                        domain=[left_param],
-                        range=["#1f77b4"],
-                    ),
-                    legend=alt.Legend(title="Metric"),
-                ),
-                tooltip=[
-                    alt.Tooltip("metric:N", title="Metric"),
-                    alt.Tooltip("period:N", title="Period"),
-                    alt.Tooltip("year:Q", title="Year"),
-                    alt.Tooltip("quarter:N", title="Quarter"),
-                    alt.Tooltip("scaled_value:Q", title=axis_title, format=".2f"),
-                ],
-            )
-        )
+        plot_df = series_df.assign(
+            scaled_value=series_df["value_final"].to_numpy() / scale,
+            metric=left_param,
+        )[plot_cols]
+
+        spec = {
+            "$schema": _VEGA_LITE_SCHEMA,
+            **_line_layer(
+                plot_df, period_order, axis_title,
+                color_domain=[left_param], color_range=["#1f77b4"],
+            ),
+        }
 
-        st.write(
+        caption = (
             f"Showing **{left_param}** over time "
             f"(scaled to {unit or 'original units'})."
         )
-        st.altair_chart(chart, use_container_width=True)
+        st.session_state["_qfc_cache"] = (cache_key, spec, caption)
+        st.write(caption)
+        st.vega_lite_chart(spec, use_container_width=True)
         return
 
     # ---------- Dual-axis case (different parameters) ---------- #
-    left_df = df[df["parameter"] == left_param]
-    right_df = df[df["parameter"] == right_param]
+    left_df = needed[needed["parameter"] == left_param]
+    right_df = needed[needed["parameter"] == right_param]
 
     if left_df.empty:
         st.warning(f"No data available for LEFT parameter: {left_param}")
@@ -176,77 +269,40 @@ def quarterly_fundamental_chart(code: str, df_quarter):
         right_param if unit_right == "" else f"{right_param} ({unit_right})"
     )
 
-    # Shared color scale & legend for both layers
-    color_scale = alt.Scale(
-        domain=[left_param, right_param],
-        range=["#1f77b4", "#ff7f0e"],
-    )
-    legend = alt.Legend(title="Metric")
-
-    left_line = (
-        base.transform_filter(
-            alt.datum.parameter == left_param
-        )
-        .transform_calculate(
-            scaled_value=f"datum.value_final / {scale_left}",
-            metric=f"'{left_param}'",
-        )
-        .mark_line(point=True)
-        .encode(
-            y=alt.Y(
-                "scaled_value:Q",
-                axis=alt.Axis(title=axis_title_left),
+    # Shared color domain/range so both layers land in one legend
+    color_domain = [left_param, right_param]
+    color_range = ["#1f77b4", "#ff7f0e"]
+
+    left_plot = left_df.assign(
+        scaled_value=left_df["value_final"].to_numpy() / scale_left,
+        metric=left_param,
+    )[plot_cols]
+
+    right_plot = right_df.assign(
+        scaled_value=right_df["value_final"].to_numpy() / scale_right,
+        metric=right_param,
+    )[plot_cols]
+
+    spec = {
+        "$schema": _VEGA_LITE_SCHEMA,
+        "layer": [
+            _line_layer(
+                left_plot, period_order, axis_title_left,
+                color_domain, color_range,
             ),
-            color=alt.Color(
-                "metric:N",
-                scale=color_scale,
-                legend=legend,
+            _line_layer(
+                right_plot, period_order, axis_title_right,
+                color_domain, color_range, orient="right",
             ),
-            tooltip=[
-                alt.Tooltip("metric:N", title="Metric"),
-                alt.Tooltip("period:N", title="Period"),
-                alt.Tooltip("year:Q", title="Year"),
-                alt.Tooltip("quarter:N", title="Quarter"),
-                alt.Tooltip("scaled_value:Q", title=axis_title_left, format=".2f"),
-            ],
-        )
-    )
-
-    right_line = (
-        base.transform_filter(
-            alt.datum.parameter == right_param
-        )
-        .transform_calculate(
-            scaled_value=f"datum.value_final / {scale_right}",
-            metric=f"'{right_param}'",
-        )
-        .mark_line(point=True)
-        .encode(
-            y=alt.Y(
-                "scaled_value:Q",
-                axis=alt.Axis(title=axis_title_right, orient="right"),
-            ),
-            color=alt.Color(
-                "metric:N",
-                scale=color_scale,
-                legend=legend,
-            ),
-            tooltip=[
-                alt.Tooltip("metric:N", title="Metric"),
-                alt.Tooltip("period:N", title="Period"),
-                alt.Tooltip("year:Q", title="Year"),
-                alt.Tooltip("quarter:N", title="Quarter"),
-                alt.Tooltip("scaled_value:Q", title=axis_title_right, format=".2f"),
-            ],
-        )
-    )
-
-    chart = alt.layer(left_line, right_line).resolve_scale(
-        y="independent"  # separate y-scales for left/right axes
-    )
+        ],
+        # separate y-scales for left/right axes
+        "resolve": {"scale": {"y": "independent"}},
+    }
 
-    st.write(
+    caption = (
         f"Showing **{left_param}** (left axis, scaled to {unit_left or 'original units'}) "
         f"and **{right_param}** (right axis, scaled to {unit_right or 'original units'})."
     )
-    st.altair_chart(chart, use_container_width=True)
+    st.session_state["_qfc_cache"] = (cache_key, spec, caption)
+    st.write(caption)
+    st.vega_lite_chart(spec, use_container_width=True)
@@ -1,158 +1,193 @@
+import types
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 from typing import List
 
+_CORE_METRICS_IN_ORDER = (
+    # QUALITY
+    "Return On Invested Capital (TTM)",
+    "Return on Equity (TTM)",
+    "Operating Profit Margin (Quarter)",
+    "Current EPS (TTM)",
+
+    # GROWTH
+    "Revenue (Quarter YoY Growth)",
+    "EPS Growth (TTM)",
+    "Net Income (Quarter YoY Growth)",
+
+    # CASH FLOW
+    "Cash From Operations (TTM)",
+    "Free cash flow (TTM)",
+    "Free Cashflow Per Share (TTM)",
+
+    # RISK
+    "Debt to Equity Ratio (Quarter)",
+    "Interest Coverage (TTM)",
+    "Net Debt (Quarter)",
+    "Current Ratio (Quarter)",
+    "Altman Z-Score (Modified)",
+
+    # EFFICIENCY
+    "Asset Turnover (TTM)",
+    "Cash Conversion Cycle (Quarter)",
+    "Inventory Turnover (TTM)",
+
+    # VALUATION
+    "Current PE Ratio (TTM)",
+    "PEG Ratio",
+)
+
+# Segment lookup aligned positionally with _CORE_METRICS_IN_ORDER:
+# metric -> integer code once, then one array take per table build
+# instead of a dict .get per row.
+_SEG_CODES = {m: i for i, m in enumerate(_CORE_METRICS_IN_ORDER)}
+_SEG_BY_CODE = np.array(
+    ["Quality"] * 4
+    + ["Growth"] * 3
+    + ["Cash Flow"] * 3
+    + ["Risk"] * 5
+    + ["Efficiency"] * 3
+    + ["Valuation"] * 2,
+    dtype=object,
+)
+
+_SEGMENT_COLORS = types.MappingProxyType({
+    "Quality":   "#FFFFFF",
+    "Growth":    "#E1F5F8",
+    "Cash Flow": "#FFFFFF",
+    "Risk":      "#E1F5F8",
+    "Efficiency": "#FFFFFF",
+    "Valuation": "#E1F5F8",
+})
+
+# Inline row-style attribute per segment, derived once from the colors.
+_ROW_STYLE = {
+    seg: f' style="background-color:{color}"'
+    for seg, color in _SEGMENT_COLORS.items()
+    if color
+}
+
+
+def _format_block(s: pd.Series) -> pd.Series:
+    """
+    Format one numeric column into K / M / B / T strings, keeping small
+    numbers as tidy decimals and NaN as "". Runs as mask-based NumPy
+    passes over the whole column rather than one Python call per cell.
+    """
+    a = s.to_numpy(dtype=float)
+    abs_a = np.abs(a)
 
-def human_format(x):
-    """Format numbers into K / M / B / T, keep small numbers as decimals."""
-    if pd.isna(x):
-        return ""
-    if not isinstance(x, (int, float)):
-        return x
+    m_t = abs_a >= 1e12
+    m_b = (abs_a >= 1e9) & ~m_t
+    m_m = (abs_a >= 1e6) & ~(m_t | m_b)
+    m_k = (abs_a >= 1e3) & ~(m_t | m_b | m_m)
 
-    abs_x = abs(x)
+    scaled = np.select(
+        [m_t, m_b, m_m, m_k], [a / 1e12, a / 1e9, a / 1e6, a / 1e3], default=a
+    )
+    suffix = np.select([m_t, m_b, m_m, m_k], ["T", "B", "M", "K"], default="")
 
-    if abs_x >= 1e12:
-        return f"{x / 1e12:.2f}T"
-    elif abs_x >= 1e9:
-        return f"{x / 1e9:.2f}B"
-    elif abs_x >= 1e6:
-        return f"{x / 1e6:.2f}M"
-    elif abs_x >= 1e3:
-        return f"{x / 1e3:.2f}K"
-    else:
-        return f"{x:.4f}".rstrip("0").rstrip(".")
+    nan_mask = np.isnan(a)
+    big = m_t | m_b | m_m | m_k
 
+    out = np.char.add(
+        np.char.mod("%.2f", np.nan_to_num(scaled)), suffix
+    ).astype(object)
 
-def render_core_fundamental_table(code: str, df_all: pd.DataFrame) -> None:
+    small = ~big & ~nan_mask
+    out[small] = [f"{v:.4f}".rstrip("0").rstrip(".") for v in scaled[small]]
+    out[nan_mask] = ""
+
+    return pd.Series(out, index=s.index)
+
+
+@st.cache_data(
+    show_spinner=False,
+    hash_funcs={pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=True).sum()},
+)
+def _build_core_table_html(code: str, df_all: pd.DataFrame):
     """
-    Render the core fundamental table for the given stock code.
-    Uses df_all that has already been fetched (no extra queries).
+    Build the core-fundamentals table HTML for one code. Returns
+    (table_html, None) on success or (None, warning_message) when there
+    is nothing to show. Cached so reruns with the same inputs skip the
+    pivot and styling entirely.
     """
 
-    # ---- 1. Compute competitor list based on market cap ----
-    df_market = (
-        df_all[(df_all["metric"] == "market_cap") & (df_all["code"] != code)]
-        [["code", "clean_value"]]
-        .drop_duplicates()
+    # Low-cardinality string columns as categoricals: the equality and
+    # isin masks below then compare integer codes instead of strings.
+    df_all = df_all.assign(
+        metric=df_all["metric"].astype("category"),
+        code=df_all["code"].astype("category"),
     )
 
+    # ---- 1. Compute competitor list based on market cap ----
+    # Share the metric/code series across both filters so df_all is
+    # scanned once per mask. Dedupe per code BEFORE truncating: a code
+    # with several market_cap rows must fill one slot, not crowd out
+    # other peers from the top 5.
+    metric_s = df_all["metric"]
+    code_s = df_all["code"]
+
+    is_market = (metric_s == "market_cap") & (code_s != code)
     competitors_sorted = (
-        df_market.sort_values("clean_value", ascending=False)["code"]
-        .unique()
+        df_all.loc[is_market, ["code", "clean_value"]]
+        .sort_values("clean_value", ascending=False)
+        .drop_duplicates("code")
+        .head(5)["code"]
+        .astype(str)
         .tolist()
     )
 
-    # Take top 5 competitors
-    competitors_sorted = competitors_sorted[:5]
-
     # Final column order: selected code FIRST, then competitors (in market-cap order)
     final_cols: List[str] = [code] + competitors_sorted
 
-    # ---- 2. Build pivot table: metric x code ----
-    df_filtered = (
-        df_all[df_all["code"].isin(final_cols)][["code", "metric", "clean_value"]]
-        .drop_duplicates()
-    )
+    # ---- 2. Keep only the rows for the selected peer set. No
+    # drop_duplicates here: the direct matrix fill below overwrites
+    # repeated (code, metric) rows anyway. ----
+    df_filtered = df_all.loc[code_s.isin(final_cols).to_numpy(),
+                             ["code", "metric", "clean_value"]]
 
     if df_filtered.empty:
-        st.warning("No data available for this stock.")
-        return
-
-    df = df_filtered.pivot(index="metric", columns="code", values="clean_value")
-
-    # Ensure final column order inside pivot (skip any that might not exist)
-    df = df[[c for c in final_cols if c in df.columns]]
+        return None, "No data available for this stock."
 
     # ---- 3. Keep only core metrics, in desired group order ----
-    core_metrics_in_order = [
-        # QUALITY
-        "Return On Invested Capital (TTM)",
-        "Return on Equity (TTM)",
-        "Operating Profit Margin (Quarter)",
-        "Current EPS (TTM)",
-
-        # GROWTH
-        "Revenue (Quarter YoY Growth)",
-        "EPS Growth (TTM)",
-        "Net Income (Quarter YoY Growth)",
-
-        # CASH FLOW
-        "Cash From Operations (TTM)",
-        "Free cash flow (TTM)",
-        "Free Cashflow Per Share (TTM)",
-
-        # RISK
-        "Debt to Equity Ratio (Quarter)",
-        "Interest Coverage (TTM)",
-        "Net Debt (Quarter)",
-        "Current Ratio (Quarter)",
-        "Altman Z-Score (Modified)",
-
-        # EFFICIENCY
-        "Asset Turnover (TTM)",
-        "Cash Conversion Cycle (Quarter)",
-        "Inventory Turnover (TTM)",
-
-        # VALUATION
-        "Current PE Ratio (TTM)",
-        "PEG Ratio",
-    ]
-
-    metrics_available = [m for m in core_metrics_in_order if m in df.index]
+    metric_arr = df_filtered["metric"].to_numpy()
+    code_arr = df_filtered["code"].to_numpy()
+    value_arr = df_filtered["clean_value"].to_numpy()
+
+    present_metrics = set(metric_arr)
+    metrics_available = [m for m in _CORE_METRICS_IN_ORDER if m in present_metrics]
 
     if not metrics_available:
-        st.warning("No core metrics available for this stock.")
-        return
+        return None, "No core metrics available for this stock."
+
+    # Both axes are known up front, so allocate the metric x code matrix
+    # directly and fill it in one pass instead of running a general
+    # pivot with its MultiIndex machinery. Index.intersection keeps the
+    # final_cols order and runs the membership test at C level.
+    cols = pd.Index(final_cols).intersection(code_arr, sort=False).tolist()
+
+    metric_idx = {m: i for i, m in enumerate(metrics_available)}
+    code_idx = {c: j for j, c in enumerate(cols)}
 
-    df_core = df.loc[metrics_available].copy()
-
-    # ---- 4. Segment color mapping + add Segment column ----
-    metric_to_segment = {
-        # QUALITY
-        "Return On Invested Capital (TTM)": "Quality",
-        "Return on Equity (TTM)": "Quality",
-        "Operating Profit Margin (Quarter)": "Quality",
-        "Current EPS (TTM)": "Quality",
-
-        # GROWTH
-        "Revenue (Quarter YoY Growth)": "Growth",
-        "EPS Growth (TTM)": "Growth",
-        "Net Income (Quarter YoY Growth)": "Growth",
-
-        # CASH FLOW
-        "Cash From Operations (TTM)": "Cash Flow",
-        "Free cash flow (TTM)": "Cash Flow",
-        "Free Cashflow Per Share (TTM)": "Cash Flow",
-
-        # RISK
-        "Debt to Equity Ratio (Quarter)": "Risk",
-        "Interest Coverage (TTM)": "Risk",
-        "Net Debt (Quarter)": "Risk",
-        "Current Ratio (Quarter)": "Risk",
-        "Altman Z-Score (Modified)": "Risk",
-
-        # EFFICIENCY
-        "Asset Turnover (TTM)": "Efficiency",
-        "Cash Conversion Cycle (Quarter)": "Efficiency",
-        "Inventory Turnover (TTM)": "Efficiency",
-
-        # VALUATION
-        "Current PE Ratio (TTM)": "Valuation",
-        "PEG Ratio": "Valuation",
-    }
-
-    segment_colors = {
-        "Quality":   "#FFFFFF",
-        "Growth":    "#E1F5F8",
-        "Cash Flow": "#FFFFFF",
-        "Risk":      "#E1F5F8",
-        "Efficiency":"#FFFFFF",
-        "Valuation": "#E1F5F8",
-    }
-
-    # Add Segment column based on metric index
-    df_core["Segment"] = [metric_to_segment.get(m, "") for m in df_core.index]
+    out = np.full((len(metrics_available), len(cols)), np.nan)
+    for c, m, v in zip(code_arr, metric_arr, value_arr):
+        i = metric_idx.get(m)
+        if i is not None:
+            out[i, code_idx[c]] = v
+
+    df_core = pd.DataFrame(
+        out, index=pd.Index(metrics_available, name="metric"), columns=cols
+    )
+
+    # ---- 4. Add Segment column based on metric index: integer codes into the
+    # aligned segment array, no per-row dict hashing
+    seg_idx = np.fromiter(
+        (_SEG_CODES[m] for m in df_core.index), dtype=np.int32, count=len(df_core)
+    )
+    df_core["Segment"] = _SEG_BY_CODE[seg_idx]
 
     # Move metric out of index into a real column "Metric"
     df_core = df_core.reset_index()
@@ -160,31 +195,50 @@ def render_core_fundamental_table(code: str, df_all: pd.DataFrame) -> None:
 
     # Desired column order in the table:
     # Segment | Metric | <selected code> | <competitors...>
-    col_order = ["Segment", "Metric"] + [c for c in final_cols if c in df_core.columns]
+    col_order = ["Segment", "Metric"] + pd.Index(final_cols).intersection(
+        df_core.columns, sort=False
+    ).tolist()
     df_core = df_core[col_order]
 
-    # ---- 5. Row-wise highlight: color ENTIRE row including Segment + Metric ----
-    def highlight_row(row):
-        segment = row["Segment"]
-        color = segment_colors.get(segment, "")
-        if color:
-            return [f"background-color: {color}"] * len(row)
-        else:
-            return [""] * len(row)
-
-    # Only format numeric columns (the tickers); Segment & Metric stay as text
+    # Only format numeric columns (the tickers); Segment & Metric stay
+    # as text. Formatting happens once per column here, so the Styler
+    # does no per-cell dispatch.
     numeric_cols = [c for c in df_core.columns if c not in ("Segment", "Metric")]
+    df_core[numeric_cols] = df_core[numeric_cols].apply(_format_block)
+
+    # ---- 5. Emit the HTML directly: a static header plus one f-string
+    # row per metric. Cell formatting already happened above, and the
+    # segment colors are inlined per row, so no Styler/Jinja pass runs.
+    # The base table rules live in assets/theme.css (.core-fundamentals).
+    header_cells = "".join(f"<th>{c}</th>" for c in df_core.columns)
+    rows_html = "\n".join(
+        f"<tr{_ROW_STYLE.get(seg, '')}><td>{seg}</td><td>{metric}</td>"
+        + "".join(f"<td>{v}</td>" for v in vals)
+        + "</tr>"
+        for seg, metric, *vals in df_core.itertuples(index=False)
+    )
 
-    styled = (
-        df_core
-        .style
-        .format(human_format, subset=numeric_cols)
-        .apply(highlight_row, axis=1)
+    table_html = (
+        '<table class="core-fundamentals">'
+        f"<thead><tr>{header_cells}</tr></thead>"
+        f"<tbody>{rows_html}</tbody>"
+        "</table>"
     )
 
-    # ---- 6. Render inside a themed card so it matches the app ----
-    table_html = styled.to_html()
+    return table_html, None
+
+
+def render_core_fundamental_table(code: str, df_all: pd.DataFrame) -> None:
+    """
+    Render the core fundamental table for the given stock code.
+    Uses df_all that has already been fetched (no extra queries).
+    """
+    table_html, warning = _build_core_table_html(code, df_all)
+    if table_html is None:
+        st.warning(warning)
+        return
 
+    # Render inside a themed card so it matches the app
     st.markdown(
         f"""
         <div class="card-light" style="margin-top: 1.2rem;">
@@ -1,6 +1,15 @@
 from pathlib import Path
 import streamlit as st
 
+
+@st.cache_data(show_spinner=False)
+def _read_css(path: str) -> str:
+    """
+    Read the theme stylesheet once per path; every rerun after the first
+    is a cache lookup instead of a disk read.
+    """
+    return Path(path).read_text(encoding="utf-8")
+
+
 def load_theme_css(path: str = "assets/theme.css") -> None:
-    css = Path(path).read_text(encoding="utf-8")
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{_read_css(path)}</style>", unsafe_allow_html=True)